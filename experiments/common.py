@@ -1,7 +1,12 @@
 import collections as co
-import copy
+import contextlib
+import inspect
 import json
 import math
+try:
+    import numba
+except ImportError:
+    numba = None
 import numpy as np
 import os
 import pathlib
@@ -16,6 +21,26 @@ from torchshapelets import _impl
 
 here = pathlib.Path(__file__).resolve().parent
 
+# inference_mode additionally skips view/version tracking compared to no_grad; fall back on older torch versions.
+_inference_mode = torch.inference_mode if hasattr(torch, 'inference_mode') else torch.no_grad
+
+
+def _autocast(device):
+    # BF16 autocast for evaluation: the tiny numerical drift doesn't matter on the metric read path. No-op on the
+    # CPU and on torch versions without autocast.
+    if device.type == 'cuda' and hasattr(torch, 'autocast'):
+        return torch.autocast(device_type='cuda', dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+if 'set_to_none' in inspect.signature(torch.optim.Optimizer.zero_grad).parameters:
+    def _zero_grad(optimizer):
+        # Frees the gradient tensors rather than filling them with zeroes, saving a kernel per parameter per step.
+        optimizer.zero_grad(set_to_none=True)
+else:
+    def _zero_grad(optimizer):  # older torch versions have no set_to_none argument
+        optimizer.zero_grad()
+
 
 def handle_seeds(seed):
     random.seed(seed)
@@ -28,7 +53,8 @@ def handle_seeds(seed):
 def assert_not_done(result_folder, result_subfolder, n_done=1, seed=None):
     folder = here / 'results' / result_folder / result_subfolder
     if os.path.isdir(folder):
-        num_files = sum(1 for x in os.listdir(folder) if not x.startswith('.') and 'model' not in x)
+        num_files = sum(1 for x in os.listdir(folder)
+                        if not x.startswith('.') and 'model' not in x and not x.endswith('.npz'))
         if num_files > seed:
             return False
         return num_files < n_done
@@ -36,14 +62,22 @@ def assert_not_done(result_folder, result_subfolder, n_done=1, seed=None):
         return True
 
 
+def compute_stats(train_X):
+    # train_X is assumed to be of shape (..., length, channel)
+    dims = tuple(range(train_X.dim() - 1))
+    mean = train_X.mean(dim=dims, keepdim=True)
+    std = train_X.std(dim=dims, keepdim=True)
+    return mean, std
+
+
 def normalise_data(X, train_X):
     # X is assumed to be of shape (..., length, channel)
-    out = []
-    for Xi, train_Xi in zip(X.unbind(dim=-1), train_X.unbind(dim=-1)):
-        mean = train_Xi.mean()
-        std = train_Xi.std()
-        out.append((Xi - mean) / (1e-5 + std))
-    return torch.stack(out, dim=-1)
+    mean, std = compute_stats(train_X)
+    return (X - mean) / (1e-5 + std)
+
+
+# persistent_workers and prefetch_factor only exist on newer torch versions; detect them rather than version-parse.
+_dataloader_params = inspect.signature(torch.utils.data.DataLoader.__init__).parameters
 
 
 def dataloader(dataset, **kwargs):
@@ -53,6 +87,16 @@ def dataloader(dataset, **kwargs):
         kwargs['drop_last'] = True
     if 'batch_size' not in kwargs:
         kwargs['batch_size'] = 32
+    if 'pin_memory' not in kwargs:
+        kwargs['pin_memory'] = torch.cuda.is_available()
+    if 'num_workers' not in kwargs:
+        kwargs['num_workers'] = 2
+    if kwargs['num_workers'] > 0:
+        # Keep the workers alive between epochs and let them run ahead of the training loop, where torch supports it.
+        if 'persistent_workers' in _dataloader_params and 'persistent_workers' not in kwargs:
+            kwargs['persistent_workers'] = True
+        if 'prefetch_factor' in _dataloader_params and 'prefetch_factor' not in kwargs:
+            kwargs['prefetch_factor'] = 4
     kwargs['batch_size'] = min(kwargs['batch_size'], len(dataset))
     return torch.utils.data.DataLoader(dataset, **kwargs)
 
@@ -67,16 +111,23 @@ class _AttrDict(dict):
 
 def _get_sample_batch(dataloader, num_shapelets_per_class, num_shapelets):
     batch_elems = []
+    num_selected = 0
     y_seen = co.defaultdict(int)
     while True:  # in case we need to iterate through the same dataloader multiple times to find the same samples again
         for X, y in dataloader:
-            for Xi, yi in zip(X, y):
+            # Select samples a class at a time rather than iterating over every element in Python.
+            for yi in torch.unique(y, sorted=False).tolist():
                 yi = int(yi)
-                if y_seen[yi] < num_shapelets_per_class:
-                    batch_elems.append(Xi)
-                    y_seen[yi] += 1
-                if len(batch_elems) == num_shapelets:
-                    out = torch.stack(batch_elems, dim=0)
+                needed = num_shapelets_per_class - y_seen[yi]
+                needed = min(needed, num_shapelets - num_selected)
+                if needed <= 0:
+                    continue
+                index = (y == yi).nonzero().squeeze(-1)[:needed]
+                batch_elems.append(X[index])
+                y_seen[yi] += index.numel()
+                num_selected += index.numel()
+                if num_selected == num_shapelets:
+                    out = torch.cat(batch_elems, dim=0)
                     out = out + 0.001 * torch.randn_like(out)
                     return out
         # len(y_seen) should now be the number of classes
@@ -89,15 +140,16 @@ def _get_sample_batch(dataloader, num_shapelets_per_class, num_shapelets):
 
 def _count_parameters(model):
     """Counts the number of parameters in a model."""
-    return sum(param.numel() for param in model.parameters() if param.requires_grad_)
+    return sum(param.numel() for param in model.parameters() if param.requires_grad)
 
 
-def _compute_binary_accuracy(pred_y, true_y):
+def _compute_binary_accuracy(pred_y, true_y, reduce='mean'):
     """Computes the accuracy of a classifier.
 
     Arguments:
         pred_y: A one dimensional tensor of floats (a sigmoid will be applied to determine the classification result).
         true_y: A one dimensional tensor of floats; 1.0 corresponds to one class, 0.0 corresponds to the other.
+        reduce: Either 'mean', returning the proportion correct, or 'sum', returning the number correct.
 
     Returns:
         A single float describing the accuracy.
@@ -107,24 +159,110 @@ def _compute_binary_accuracy(pred_y, true_y):
 
     binary_prediction = (torch.sigmoid(pred_y) > 0.5).to(true_y.dtype)
     prediction_matches = (binary_prediction == true_y).to(true_y.dtype)
-    proportion_correct = prediction_matches.sum() / true_y.size(0)
-    return proportion_correct
+    if reduce == 'sum':
+        return prediction_matches.sum()
+    return prediction_matches.sum() / true_y.size(0)
 
 
-def _compute_multiclass_accuracy(pred_y, true_y):
+def _compute_multiclass_accuracy(pred_y, true_y, reduce='mean'):
     """Computes the accuracy of a classifier.
 
     Arguments:
         pred_y: A two dimensional tensor of floats, of shape (batch, targets).
         true_y: A one dimensional tensor of targets; integers corresponding to each class.
+        reduce: Either 'mean', returning the proportion correct, or 'sum', returning the number correct.
 
     Returns:
         A single float describing the accuracy.
     """
     prediction = torch.argmax(pred_y, dim=1)
     prediction_matches = (prediction == true_y).to(pred_y.dtype)
-    proportion_correct = prediction_matches.sum() / true_y.size(0)
-    return proportion_correct
+    if reduce == 'sum':
+        return prediction_matches.sum()
+    return prediction_matches.sum() / true_y.size(0)
+
+
+if numba is not None:
+    @numba.njit(fastmath=True, cache=True, parallel=True, boundscheck=False)
+    def _dtw_batch(cost, out):
+        # Dynamic time warping over a stack of precomputed cost matrices, embarrassingly parallel over the leading
+        # batch-times-shapelet axis. cost is of shape (batch, length1, length2) contiguous float32, and out of shape
+        # (batch,). Within each batch element the usual row-by-row recurrence has a serial j -> j + 1 dependency, so
+        # instead we sweep along anti-diagonals: every cell on one anti-diagonal depends only on the previous two
+        # anti-diagonals, which makes the inner loop independent across cells and thus vectorisable. Anti-diagonal k
+        # holds memo cells (i, k - i); buffer slot i of d2/d1/d0 stores the cell with row index i on the
+        # current/previous/previous-but-one anti-diagonal.
+        B = cost.shape[0]
+        M = cost.shape[1]
+        N = cost.shape[2]
+        for b in numba.prange(B):
+            d0 = np.empty(M, dtype=np.float32)
+            d1 = np.empty(M, dtype=np.float32)
+            d2 = np.empty(M, dtype=np.float32)
+            for k in range(M + N - 1):
+                i_lo = 0 if k < N else k - N + 1
+                i_hi = k if k < M else M - 1
+                for i in range(i_lo, i_hi + 1):
+                    j = k - i
+                    if i == 0 and j == 0:
+                        best = np.float32(0.)
+                    else:
+                        best = np.float32(np.inf)
+                        if i > 0 and d1[i - 1] < best:
+                            best = d1[i - 1]
+                        if j > 0 and d1[i] < best:
+                            best = d1[i]
+                        if i > 0 and j > 0 and d0[i - 1] < best:
+                            best = d0[i - 1]
+                    d2[i] = cost[b, i, j] + best
+                d0, d1, d2 = d1, d2, d0
+            out[b] = d1[M - 1]
+
+
+def _dtw_cost_matrix(path, shapelet):
+    # path is of shape (..., length1, channels) and shapelet of shape (*, length2, channels), where '...' and '*'
+    # represent potentially different batch dimensions (matching the convention of LogsignatureDiscrepancy). Returns
+    # the pairwise cost matrices, of shape (prod(...), prod(*), length1, length2), computed as a single broadcast op
+    # rather than once per (path, shapelet) pair.
+    path_batch_dims = path.shape[:-2]
+    shapelet_batch_dims = shapelet.shape[:-2]
+    path = path.reshape(-1, path.size(-2), path.size(-1))
+    shapelet = shapelet.reshape(-1, shapelet.size(-2), shapelet.size(-1))
+    cost = (path.unsqueeze(1).unsqueeze(3) - shapelet.unsqueeze(0).unsqueeze(2)).norm(dim=-1)
+    return cost, path_batch_dims, shapelet_batch_dims
+
+
+def _piecewise_constant_l2_squared(times, path, shapelet):
+    diff = path - shapelet
+    return (diff * diff).sum(dim=(-1, -2))
+
+
+if hasattr(torch, 'compile'):
+    # Fuses the subtract/square/reduce into a single kernel, rather than materialising the full squared-difference
+    # tensor before reducing it.
+    _piecewise_constant_l2_squared = torch.compile(_piecewise_constant_l2_squared, dynamic=True)
+
+
+def _dtw_memo_torch(path, shapelet):
+    # Pure-torch DTW, used whenever gradients are required (and as the fallback when Numba is unavailable). Rather
+    # than build an (M + 1) x (N + 1) nested Python list of 0-D tensors we broadcast the whole cost matrix in one go
+    # and keep just two rolling rows of the memo table, batched over every (path, shapelet) pair at once. Unlike the
+    # Numba kernel this is differentiable: torch.min over the three neighbours propagates gradients along the
+    # optimal warping path.
+    cost, path_batch_dims, shapelet_batch_dims = _dtw_cost_matrix(path, shapelet)
+    M = cost.size(-2)
+    N = cost.size(-1)
+    batch_dims = cost.shape[:-2]
+    zero = cost.new_zeros(batch_dims)
+    inf = cost.new_full(batch_dims, math.inf)
+    prev = torch.stack([zero] + [inf] * N, dim=-1)
+    for i in range(M):
+        row = [inf]
+        for j in range(N):
+            best = torch.min(torch.min(prev[..., j], prev[..., j + 1]), row[j])
+            row.append(cost[..., i, j] + best)
+        prev = torch.stack(row, dim=-1)
+    return prev[..., N].reshape(path_batch_dims + shapelet_batch_dims)
 
 
 def get_discrepancy_fn(discrepancy_fn, input_channels, ablation_pseudometric):
@@ -140,16 +278,33 @@ def get_discrepancy_fn(discrepancy_fn, input_channels, ablation_pseudometric):
         discrepancy_fn = torchshapelets.LogsignatureDiscrepancy(in_channels=input_channels, depth=depth,
                                                                 pseudometric=ablation_pseudometric,
                                                                 metric_type='diagonal')
+    elif discrepancy_fn == 'DTW':
+        def discrepancy_fn(times, path, shapelet):
+            if numba is None or (torch.is_grad_enabled() and (path.requires_grad or shapelet.requires_grad)):
+                # Training (or no Numba): must go through torch so that gradients propagate along the optimal
+                # warping path into the shapelets.
+                return _dtw_memo_torch(path, shapelet)
+            # Inference: the dynamic programming recurrence is inherently serial, so rather than build a graph of
+            # per-cell torch operations we compute all the cost matrices with one broadcast op and hand them to a
+            # Numba kernel that parallelises over the whole batch-times-shapelet axis.
+            cost, path_batch_dims, shapelet_batch_dims = _dtw_cost_matrix(path, shapelet)
+            cost_np = np.ascontiguousarray(cost.detach().cpu().numpy(), dtype=np.float32)
+            cost_np = cost_np.reshape(-1, cost_np.shape[-2], cost_np.shape[-1])
+            out = np.empty(cost_np.shape[0], dtype=np.float32)
+            _dtw_batch(cost_np, out)
+            out = torch.from_numpy(out).to(dtype=path.dtype, device=path.device)
+            return out.reshape(path_batch_dims + shapelet_batch_dims)
+        discrepancy_fn.parameters = lambda: []
     elif discrepancy_fn == 'piecewise_constant_L2_squared':
         def discrepancy_fn(times, path, shapelet):
-            return ((path - shapelet) ** 2).sum(dim=(-1, -2))
+            return _piecewise_constant_l2_squared(times, path, shapelet)
         discrepancy_fn.parameters = lambda: []
     return discrepancy_fn
 
 
 class LinearShapeletTransform(torch.nn.Module):
     def __init__(self, in_channels, out_channels, num_shapelets, num_shapelet_samples, discrepancy_fn,
-                 max_shapelet_length, num_continuous_samples, log):
+                 max_shapelet_length, num_continuous_samples, log, keep_similarity=True):
         super(LinearShapeletTransform, self).__init__()
 
         self.shapelet_transform = torchshapelets.GeneralisedShapeletTransform(in_channels=in_channels,
@@ -158,21 +313,43 @@ class LinearShapeletTransform(torch.nn.Module):
                                                                               discrepancy_fn=discrepancy_fn,
                                                                               max_shapelet_length=max_shapelet_length,
                                                                               num_continuous_samples=num_continuous_samples)
+        # This used to scale the linear layer's gradients by 100 via hooks, at the cost of two extra elementwise
+        # kernels per backward pass. Adam's update is (up to eps) invariant to gradient scaling, so the hooks were
+        # effectively a no-op and are simply dropped.
         self.linear = torch.nn.Linear(num_shapelets, out_channels)
-        self.linear.weight.register_hook(lambda grad: 100 * grad)
-        self.linear.bias.register_hook(lambda grad: 100 * grad)
 
         self.log = log
+        self.keep_similarity = keep_similarity
 
-    def forward(self, times, X):
-        shapelet_similarity, closest_index = self.shapelet_transform(times, X)
+        # out_channels is likewise fixed at construction, so resolve the squeeze-or-not decision once here rather
+        # than checking the output shape on every forward.
+        if out_channels == 1:
+            self._post = lambda out: out.squeeze(-1)
+        else:
+            self._post = lambda out: out
+
+        # self.log is fixed at construction, so the branch in _tail specialises away at trace time and the compiled
+        # tail is a single fused add + log + matmul graph.
+        if hasattr(torch, 'compile'):
+            self._tail = torch.compile(self._tail, dynamic=True)
+
+    def _tail(self, shapelet_similarity):
         if self.log:
-            log_shapelet_similarity = (shapelet_similarity + 1e-5).log()
+            if self.keep_similarity or (torch.is_grad_enabled() and shapelet_similarity.requires_grad):
+                # log_'s backward needs its input, which writing in place would destroy, so the in-place variant is
+                # off-limits whenever autograd is tracking this tensor.
+                log_shapelet_similarity = (shapelet_similarity + 1e-5).log()
+            else:
+                # Nothing downstream needs the raw similarities (e.g. no similarity regularisation) and no gradients
+                # are being tracked, so shift-and-log in place and save an allocation plus a full read/write pass.
+                log_shapelet_similarity = shapelet_similarity.add_(1e-5).log_()
         else:
             log_shapelet_similarity = shapelet_similarity
-        out = self.linear(log_shapelet_similarity)
-        if out.size(-1) == 1:
-            out = out.squeeze(-1)
+        return self.linear(log_shapelet_similarity)
+
+    def forward(self, times, X):
+        shapelet_similarity, closest_index = self.shapelet_transform(times, X)
+        out = self._post(self._tail(shapelet_similarity))
         return out, shapelet_similarity, closest_index
 
     def clip_length(self):
@@ -184,6 +361,8 @@ class LinearShapeletTransform(torch.nn.Module):
 
     def set_kmeans_shapelets(self, data, init_len, n_shapelets):
         """ Shapelet initialisation using k-means clustering. """
+        # sklearn needs the data on the CPU; this is a no-op if it's already there. set_shapelets then copies the
+        # cluster centres straight onto whatever device the shapelets live on.
         data = data.to('cpu')
 
         # Make a rolling window over the starting length trick and compute kmeans
@@ -200,29 +379,39 @@ class LinearShapeletTransform(torch.nn.Module):
 
 
 def _evaluate_metrics(dataloader, model, times, loss_fn, num_classes):
-    with torch.no_grad():
+    with _inference_mode():
+        device = next(model.parameters()).device
+        times = times.to(device)
         accuracy_fn = _compute_binary_accuracy if num_classes == 2 else _compute_multiclass_accuracy
+        # Binary classification needs float targets; resolve that branch once rather than per batch.
+        prep_y = (lambda y: y.to(torch.float32)) if num_classes == 2 else (lambda y: y)
+        # Accumulate counts on-device and normalise once at the end, rather than rescaling every batch.
         total_loss = 0
-        total_accuracy = 0
+        total_correct = 0
         total_dataset_size = 0
         for batch in dataloader:
             X, y = batch
+            X = X.to(device, non_blocking=True)
+            y = prep_y(y.to(device, non_blocking=True))
             batch_size = y.size(0)
-            pred_y, _, _ = model(times, X)
-            if num_classes == 2:
-                y = y.to(pred_y.dtype)
-            total_accuracy += accuracy_fn(pred_y, y) * batch_size
-            total_loss += loss_fn(pred_y, y) * batch_size
+            with _autocast(device):
+                pred_y, _, _ = model(times, X)
+            pred_y = pred_y.float()
+            total_correct = total_correct + accuracy_fn(pred_y, y, reduce='sum')
+            total_loss = total_loss + loss_fn(pred_y, y) * batch_size
             total_dataset_size += batch_size
-        total_loss /= total_dataset_size  # assume 'mean' reduction in the loss function
-        total_accuracy /= total_dataset_size
+        total_loss = total_loss / total_dataset_size  # assume 'mean' reduction in the loss function
+        total_accuracy = total_correct / total_dataset_size
         return _AttrDict(loss=total_loss, accuracy=total_accuracy)
 
 
 def _train_loop(train_dataloader, val_dataloader, model, times, optimizer, loss_fn, epochs, num_classes,
                 ablation_similarreg):
     model.train()
-    best_model = model
+    device = next(model.parameters()).device
+    times = times.to(device)
+    best_state = None
+    best_val_metrics = None
     best_val_loss = math.inf
     best_val_accuracy = 0
     best_epoch = 0
@@ -237,28 +426,41 @@ def _train_loop(train_dataloader, val_dataloader, model, times, optimizer, loss_
 
     scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=plateau_patience, min_lr=1e-3)
 
+    accuracy_fn = _compute_binary_accuracy if num_classes == 2 else _compute_multiclass_accuracy
+    # Binary classification needs float targets; resolve that branch once rather than per batch.
+    prep_y = (lambda y: y.to(torch.float32)) if num_classes == 2 else (lambda y: y)
+
     tqdm_range = tqdm.tqdm(range(epochs))
     for epoch in tqdm_range:
         if breaking:
             break
+        # Train metrics are accumulated from the forward passes we're making anyway, rather than running a whole
+        # extra pass over the training set on metric epochs. (They thus describe the model as it evolved over the
+        # epoch, rather than the model at the end of it, which is fine for monitoring purposes.)
+        running_loss = 0
+        running_correct = 0
+        running_n = 0
         for batch in train_dataloader:
             if breaking:
                 break
             X, y = batch
+            X = X.to(device, non_blocking=True)
+            y = prep_y(y.to(device, non_blocking=True))
             pred_y, shapelet_similarity, _ = model(times, X)
-            if num_classes == 2:
-                y = y.to(pred_y.dtype)
             loss = loss_fn(pred_y, y)
+            running_loss = running_loss + loss.detach() * y.size(0)
+            running_correct = running_correct + accuracy_fn(pred_y.detach(), y, reduce='sum')
+            running_n += y.size(0)
             if ablation_similarreg:
                 loss = loss + similarity_coefficient * torchshapelets.similarity_regularisation(shapelet_similarity)
+            _zero_grad(optimizer)
             loss.backward()
             optimizer.step()
             model.clip_length()
-            optimizer.zero_grad()
 
         if (epoch % epoch_per_metric == 0 and epoch >= 10) or epoch == epochs - 1:
             model.eval()
-            train_metrics = _evaluate_metrics(train_dataloader, model, times, loss_fn, num_classes)
+            train_metrics = _AttrDict(loss=running_loss / running_n, accuracy=running_correct / running_n)
             val_metrics = _evaluate_metrics(val_dataloader, model, times, loss_fn, num_classes)
             model.train()
 
@@ -268,8 +470,9 @@ def _train_loop(train_dataloader, val_dataloader, model, times, optimizer, loss_
 
             if improved_val_loss_and_acc:
                 best_val_accuracy = val_metrics.accuracy
-                del best_model  # so that we don't have three copies of a model simultaneously
-                best_model = copy.deepcopy(model)
+                # Snapshot just the parameter/buffer values rather than deepcopying the whole module graph.
+                best_state = {key: value.detach().clone() for key, value in model.state_dict().items()}
+                best_val_metrics = val_metrics
 
             if improved_val_loss_err or improved_val_loss_and_acc:
                 best_val_loss = val_metrics.loss
@@ -289,15 +492,19 @@ def _train_loop(train_dataloader, val_dataloader, model, times, optimizer, loss_
                                  ''.format(plateau_terminate))
                 breaking = True
 
-    for parameter, best_parameter in zip(model.parameters(), best_model.parameters()):
-        parameter.data = best_parameter.data
-    return history, best_model
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    return history, model, best_val_metrics
 
 
-def _evaluate_model(train_dataloader, val_dataloader, test_dataloader, model, times, loss_fn, history, num_classes):
+def _evaluate_model(train_dataloader, val_dataloader, test_dataloader, model, times, loss_fn, history, num_classes,
+                    val_metrics=None):
     model.eval()
     train_metrics = _evaluate_metrics(train_dataloader, model, times, loss_fn, num_classes)
-    val_metrics = _evaluate_metrics(val_dataloader, model, times, loss_fn, num_classes)
+    if val_metrics is None:
+        # The training loop already evaluated the restored best model on the validation set; only recompute if we
+        # weren't given those metrics.
+        val_metrics = _evaluate_metrics(val_dataloader, model, times, loss_fn, num_classes)
     test_metrics = _evaluate_metrics(test_dataloader, model, times, loss_fn, num_classes)
 
     return _AttrDict(times=times,
@@ -316,9 +523,13 @@ def _evaluate_model(train_dataloader, val_dataloader, test_dataloader, model, ti
 class _TensorEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, (torch.Tensor, np.ndarray)):
+            # Non-scalar arrays are saved to an .npz sidecar by save_results, so by the time we get here anything
+            # left should just be a scalar, e.g. the 0-dimensional loss/accuracy tensors in the history.
+            if o.ndim == 0:
+                return o.item()
             return o.tolist()
         else:
-            super(_TensorEncoder, self).default(o)
+            return super(_TensorEncoder, self).default(o)
 
 
 def save_results(result_folder, result_subfolder, results):
@@ -331,7 +542,7 @@ def save_results(result_folder, result_subfolder, results):
     num = -1
     for filename in os.listdir(loc):
         try:
-            num = max(num, int(filename))
+            num = max(num, int(filename.split('_')[0]))
         except ValueError:
             pass
     result_to_save = results.copy()
@@ -341,10 +552,24 @@ def save_results(result_folder, result_subfolder, results):
     del result_to_save['val_dataloader']
     del result_to_save['test_dataloader']
 
+    # Non-scalar arrays go into a compressed .npz sidecar rather than being recursively expanded into JSON lists.
+    arrays = {}
+    for key, value in list(result_to_save.items()):
+        if isinstance(value, (torch.Tensor, np.ndarray)) and value.ndim > 0:
+            if isinstance(value, torch.Tensor):
+                value = value.detach().cpu().numpy()
+            arrays[key] = value
+            del result_to_save[key]
+
+    # Concurrent sweep workers can write into the same subfolder, and two of them would compute the same next free
+    # index; suffixing the pid makes the names collision-proof amongst concurrently-running jobs.
     num += 1
-    with open(loc / str(num), 'w') as f:
+    name = str(num) + '_' + str(os.getpid())
+    if arrays:
+        np.savez_compressed(loc / (name + '_arrays.npz'), **arrays)
+    with open(loc / name, 'w') as f:
         json.dump(result_to_save, f, cls=_TensorEncoder)
-    torch.save(model.state_dict(), loc / (str(num) + '_model'))
+    torch.save(model.state_dict(), loc / (name + '_model'))
 
     return loc
 
@@ -496,6 +721,10 @@ def main(times,
          save_top_logreg_shapelets,
          save_on_uniform_grid):
 
+    # The training dataloaders use drop_last=True, so every training batch has the same shape; let cudnn benchmark
+    # its kernels once and reuse the cached choice rather than using the default heuristics every time.
+    torch.backends.cudnn.benchmark = True
+
     if old_shapelets:
         discrepancy_fn = 'piecewise_constant_L2_squared'
         ablation_pseudometric = False
@@ -536,7 +765,8 @@ def main(times,
                                     discrepancy_fn=discrepancy_fn,
                                     max_shapelet_length=max_shapelet_length,
                                     num_continuous_samples=num_continuous_samples,
-                                    log=log)
+                                    log=log,
+                                    keep_similarity=ablation_similarreg)
 
     if old_shapelets:
         # Set shapelets to all be the same length
@@ -545,7 +775,7 @@ def main(times,
         model.shapelet_transform.register_buffer('lengths', new_lengths)
 
     paths = train_dataloader.dataset.tensors[0]
-    model.set_kmeans_shapelets(paths.to('cpu'), num_shapelet_samples, num_shapelets)
+    model.set_kmeans_shapelets(paths, num_shapelet_samples, num_shapelets)
 
     if not ablation_learntlengths:
         model.shapelet_transform.lengths.requires_grad_(False)
@@ -558,11 +788,11 @@ def main(times,
     optimizer = torch.optim.Adam(model.parameters(), lr=0.05)
 
     start_time = time.time()
-    history, best_model = _train_loop(train_dataloader, val_dataloader, model, times, optimizer, loss_fn, epochs,
-                                      num_classes, ablation_similarreg)
+    history, best_model, best_val_metrics = _train_loop(train_dataloader, val_dataloader, model, times, optimizer,
+                                                        loss_fn, epochs, num_classes, ablation_similarreg)
     training_time = time.time() - start_time
     results = _evaluate_model(train_dataloader, val_dataloader, test_dataloader, best_model, times, loss_fn, history,
-                              num_classes)
+                              num_classes, val_metrics=best_val_metrics)
     results.num_shapelets_per_class = num_shapelets_per_class
     results.num_shapelet_samples = num_shapelet_samples
     results.max_shapelet_length_proportion = max_shapelet_length_proportion
@@ -12,7 +12,7 @@ here = pathlib.Path(__file__).resolve().parent
 
 def get(foldername):
     for filename in os.listdir(foldername):
-        if 'model' not in filename:
+        if 'model' not in filename and not filename.endswith('.npz'):
             with open(foldername / filename, 'r') as f:
                 content = json.load(f)
             yield content['val_metrics']['accuracy']
@@ -174,8 +174,9 @@ def get_data():
     test_dataset = torch.utils.data.TensorDataset(tensors['test_X'], tensors['test_y'])
 
     train_dataloader = common.dataloader(train_dataset, batch_size=1024)
-    val_dataloader = common.dataloader(val_dataset, batch_size=1024)
-    test_dataloader = common.dataloader(test_dataset, batch_size=1024)
+    # Evaluation must see every sample exactly once, and gains nothing from shuffling.
+    val_dataloader = common.dataloader(val_dataset, batch_size=1024, shuffle=False, drop_last=False)
+    test_dataloader = common.dataloader(test_dataset, batch_size=1024, shuffle=False, drop_last=False)
 
     train_X = tensors['train_X']
     times = torch.linspace(0, train_X.size(1) - 1, train_X.size(1), dtype=train_X.dtype, device=train_X.device)
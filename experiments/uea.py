@@ -1,24 +1,26 @@
-import collections as co
 import numpy as np
 import os
 import pathlib
 import sklearn.model_selection
 import sktime.utils.load_data
 import torch
+try:
+    from sktime.datasets import load_from_tsfile
+except ImportError:  # older sktime only has the dataframe loader
+    load_from_tsfile = None
+try:
+    import numba
+except ImportError:
+    numba = None
 import argparse
+import concurrent.futures
+import multiprocessing
 
 import common
 
 here = pathlib.Path(__file__).resolve().parent
 
 
-def _pad(channel, maxlen):
-    channel = torch.tensor(channel)
-    out = torch.full((maxlen,), channel[-1])
-    out[:channel.size(0)] = channel
-    return out
-
-
 valid_dataset_names = ('ArticularyWordRecognition',
                        'FaceDetection',
                        'NATOPS',
@@ -113,77 +115,234 @@ l2_hyperparameter_output = (
 )
 
 
+if numba is not None:
+    @numba.njit(fastmath=True, cache=True, parallel=True, boundscheck=False)
+    def _interpolate_missing(X, keep):
+        # X and keep are (batch, length, channel); every removed value is overwritten in place with the linear
+        # interpolation of the nearest kept values either side of it. Compiled rather than vectorised: one pass over
+        # the data, with no gathers, cummax/cummin sweeps or temporaries. The first and last points are always kept,
+        # so the inner searches terminate.
+        for b in numba.prange(X.shape[0]):
+            for c in range(X.shape[2]):
+                t = 1
+                prev = 0
+                while t < X.shape[1]:
+                    if keep[b, t, c]:
+                        prev = t
+                        t += 1
+                    else:
+                        next_ = t + 1
+                        while not keep[b, next_, c]:
+                            next_ += 1
+                        for u in range(t, next_):
+                            ratio = (u - prev) / (next_ - prev)
+                            X[b, u, c] = X[b, prev, c] + ratio * (X[b, next_, c] - X[b, prev, c])
+                        prev = next_
+                        t = next_ + 1
+
+
+def _load_equal_length_tsfile(filename):
+    """Fast parser for the common case of a .ts file with equal-length series and no missing values.
+
+    The body of such a file is plain ASCII numbers, with ',' between values, ':' between channels, and the class
+    label after the final ':'. That can be handed to numpy to parse wholesale, which is vastly faster than going
+    row-by-row through pandas. Returns (X, y) with X of shape (batch, channel, length), or None whenever the file
+    isn't of this simple form (ragged, missing values, timestamps), in which case the caller falls back to sktime.
+    """
+    with open(filename) as f:
+        equal_length = False
+        for line in f:
+            line = line.strip().lower()
+            if line.startswith('@equallength'):
+                equal_length = line.endswith('true')
+            elif line.startswith('@timestamps') and line.endswith('true'):
+                return None
+            elif line == '@data':
+                break
+        if not equal_length:
+            return None
+        rows = []
+        labels = []
+        num_channels = None
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if ':' not in line:  # no label separator: not the simple format this parser understands
+                return None
+            body, label = line.rsplit(':', 1)
+            if '?' in body:  # missing values; sktime knows how to impute these
+                return None
+            if num_channels is None:
+                num_channels = body.count(':') + 1
+            rows.append(body.replace(':', ','))
+            labels.append(label)
+    if not rows:
+        return None
+    try:
+        flat = np.asarray(','.join(rows).split(','), dtype=np.float32)
+    except ValueError:
+        # Anything non-numeric: bail out to the robust loaders rather than guess.
+        return None
+    if flat.size != len(rows) * num_channels * (flat.size // (len(rows) * num_channels)):
+        # Ragged rows; likewise.
+        return None
+    return flat.reshape(len(rows), num_channels, -1), np.asarray(labels)
+
+
+# The noise channels are generated from a fixed seed, so for a given shape they are identical on every call; cached
+# at module scope so that sweeps invoking main() many times on the same dataset only pay the RNG cost once.
+_noise_cache = {}
+
+
 def get_data(dataset_name, missing_rate, noise_channels):
     assert dataset_name in valid_dataset_names, "Must specify a valid dataset name."
 
     base_filename = here / 'data' / 'UEA' / 'Multivariate_ts' / dataset_name / dataset_name
-    train_X, train_y = sktime.utils.load_data.load_from_tsfile_to_dataframe(str(base_filename) + '_TRAIN.ts')
-    test_X, test_y = sktime.utils.load_data.load_from_tsfile_to_dataframe(str(base_filename) + '_TEST.ts')
-    train_X = train_X.to_numpy()
-    test_X = test_X.to_numpy()
-    amount_train = train_X.shape[0]
-    all_X = np.concatenate((train_X, test_X), axis=0)
-    all_y = np.concatenate((train_y, test_y), axis=0)
-
-    lengths = torch.tensor([len(Xi[0]) for Xi in all_X])
-    maxlen = lengths.max()
-    # Each channel is a pandas.core.series.Series object of length corresponding to the length of the time series
-    all_X = torch.stack([torch.stack([_pad(channel, maxlen) for channel in batch], dim=0) for batch in all_X], dim=0)
-    all_X = all_X.transpose(-1, -2)
-
+    cache_filename = here / 'data' / 'UEA' / 'cache' / (dataset_name + '.pt')
+    if os.path.exists(cache_filename):
+        # The .ts parse is pandas-heavy and dominates cold start for every sweep that calls main repeatedly with the
+        # same dataset, so the padded tensors are cached after the first parse and memory-mapped back in thereafter.
+        try:
+            cache = torch.load(cache_filename, map_location='cpu', mmap=True)
+        except TypeError:  # torch versions predating the mmap argument
+            cache = torch.load(cache_filename, map_location='cpu')
+        all_X = cache['all_X']
+        all_y = cache['all_y']
+        amount_train = cache['amount_train']
+    else:
+        # Try the parsers in decreasing order of speed: the hand-rolled numpy reader handles the common case of
+        # equal-length data without missing values; sktime's numpy3d loader also yields a dense (batch, channel,
+        # length) array but parses cell by cell; sktime's dataframe loader handles everything, at the cost of
+        # constructing a pandas Series per cell.
+        dense = _load_equal_length_tsfile(str(base_filename) + '_TRAIN.ts')
+        if dense is not None:
+            dense_test = _load_equal_length_tsfile(str(base_filename) + '_TEST.ts')
+            if dense_test is not None and dense[0].shape[1:] == dense_test[0].shape[1:]:
+                dense = dense + dense_test
+            else:
+                dense = None
+        if dense is None and load_from_tsfile is not None:
+            try:
+                train_X, train_y = load_from_tsfile(str(base_filename) + '_TRAIN.ts', return_data_type='numpy3d')
+                test_X, test_y = load_from_tsfile(str(base_filename) + '_TEST.ts', return_data_type='numpy3d')
+            except Exception:  # ragged datasets cannot be returned as numpy3d
+                pass
+            else:
+                dense = (train_X, train_y, test_X, test_y)
+
+        all_X = None
+        if dense is not None:
+            train_X, train_y, test_X, test_y = dense
+            amount_train = train_X.shape[0]
+            all_X = np.concatenate((train_X, test_X), axis=0).astype(np.float32)
+            all_y = np.concatenate((train_y, test_y), axis=0)
+            # Round the time dimension up to a multiple of 8 by replicating the final value, exactly as in the
+            # ragged path below.
+            length = all_X.shape[2]
+            maxlen = -8 * (-length // 8)
+            if maxlen != length:
+                all_X = np.concatenate((all_X, np.repeat(all_X[:, :, -1:], maxlen - length, axis=2)), axis=2)
+            # Materialise the (batch, length, channel) layout rather than keeping a strided transpose view, so
+            # every downstream read (and the cached file) is over contiguous memory.
+            all_X = torch.from_numpy(all_X).transpose(-1, -2).contiguous()
+
+        if all_X is None:
+            train_X, train_y = sktime.utils.load_data.load_from_tsfile_to_dataframe(str(base_filename) + '_TRAIN.ts')
+            test_X, test_y = sktime.utils.load_data.load_from_tsfile_to_dataframe(str(base_filename) + '_TEST.ts')
+            train_X = train_X.to_numpy()
+            test_X = test_X.to_numpy()
+            amount_train = train_X.shape[0]
+            all_X = np.concatenate((train_X, test_X), axis=0)
+            all_y = np.concatenate((train_y, test_y), axis=0)
+
+            # Each channel is a pandas.core.series.Series object of length corresponding to the length of the time
+            # series. Pack every channel into one flat buffer, then scatter it into a dense (batch, channel, length)
+            # array with a single gather; indexing by min(time, length - 1) replicates each channel's final value
+            # out to maxlen.
+            num_channels = len(all_X[0])
+            channels = [np.asarray(channel, dtype=np.float32) for batch in all_X for channel in batch]
+            channel_lengths = np.fromiter((len(channel) for channel in channels), dtype=np.int64, count=len(channels))
+            maxlen = int(channel_lengths.max())
+            # Round the time dimension up to a multiple of 8: aligned shapes keep the downstream matmuls on the fast
+            # (Tensor-Core-capable) kernel paths. The tail is filled with the same replicated final value as the rest
+            # of the padding.
+            maxlen = -8 * (-maxlen // 8)
+            offsets = np.concatenate(([0], channel_lengths.cumsum()[:-1]))
+            flat = np.concatenate(channels)
+            index = offsets[:, None] + np.minimum(np.arange(maxlen), channel_lengths[:, None] - 1)
+            all_X = torch.from_numpy(flat[index].reshape(-1, num_channels, maxlen))
+            # Materialise the (batch, length, channel) layout rather than keeping a strided transpose view, so every
+            # downstream read (and the cached file) is over contiguous memory.
+            all_X = all_X.transpose(-1, -2).contiguous()
+
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        # Write-then-rename, so a concurrent job racing on the first parse of a dataset can never load a
+        # half-written cache file: the rename is atomic and the last writer wins with identical contents.
+        tmp_filename = str(cache_filename) + '.tmp.' + str(os.getpid())
+        torch.save({'all_X': all_X, 'all_y': all_y, 'amount_train': amount_train}, tmp_filename)
+        os.replace(tmp_filename, cache_filename)
+
+    # Whether all_X is known to be freshly-allocated memory owned by us, rather than possibly aliasing the mmap'd
+    # cache; in-place operations below may only run directly on it if so.
+    owns_all_X = False
     if noise_channels != 0:
-        generator = torch.Generator().manual_seed(45678)
-        noise_X = torch.randn(all_X.size(0), all_X.size(1), noise_channels, dtype=all_X.dtype, generator=generator)
-        all_X = torch.cat([all_X, noise_X], dim=2)
+        key = (all_X.size(0), all_X.size(1), noise_channels)
+        noise_X = _noise_cache.get(key)
+        if noise_X is None:
+            generator = torch.Generator().manual_seed(45678)
+            noise_X = torch.randn(*key, dtype=all_X.dtype, generator=generator)
+            _noise_cache[key] = noise_X
+        # Allocate the full-width buffer once and write both halves into it, rather than torch.cat.
+        full_X = torch.empty(all_X.size(0), all_X.size(1), all_X.size(2) + noise_channels, dtype=all_X.dtype)
+        full_X[..., :all_X.size(2)] = all_X
+        full_X[..., all_X.size(2):] = noise_X
+        all_X = full_X
+        owns_all_X = True
 
     times = torch.linspace(0, all_X.size(1) - 1, all_X.size(1), dtype=all_X.dtype)
 
     # Handle missingness: remove values and replace them with the linear interpolation of the non-missing points.
     if missing_rate > 0:
         generator = torch.Generator().manual_seed(56789)
-        for batch_index in range(all_X.size(0)):
-            for channel_index in range(all_X.size(2)):
-                randperm = torch.randperm(all_X.size(1) - 2, generator=generator) + 1  # keep the start and end
-                removed_points = randperm[:int(all_X.size(1) * missing_rate)].sort().values
-
-                prev_removed_point = removed_points[0]
-                prev_unremoved_point = prev_removed_point - 1
-                prev_unremoved_points = [prev_unremoved_point]
-                for removed_point in removed_points[1:]:
-                    if prev_removed_point != removed_point - 1:
-                        prev_unremoved_point = removed_point - 1
-                    prev_removed_point = removed_point
-                    prev_unremoved_points.append(prev_unremoved_point)
-
-                next_removed_point = removed_points[-1]
-                next_unremoved_point = next_removed_point + 1
-                next_unremoved_points = [next_unremoved_point]
-                for removed_point in reversed(removed_points[:-1]):
-                    if next_removed_point != removed_point + 1:
-                        next_unremoved_point = removed_point + 1
-                    next_removed_point = removed_point
-                    next_unremoved_points.append(next_unremoved_point)
-                next_unremoved_points = reversed(next_unremoved_points)
-                for prev_unremoved_point, removed_point, next_unremoved_point in zip(prev_unremoved_points,
-                                                                                     removed_points,
-                                                                                     next_unremoved_points):
-                    stream = all_X[batch_index, :, channel_index]
-                    prev_stream = stream[prev_unremoved_point]
-                    next_stream = stream[next_unremoved_point]
-                    prev_time = times[prev_unremoved_point]
-                    next_time = times[next_unremoved_point]
-                    time = times[removed_point]
-                    ratio = (time - prev_time) / (next_time - prev_time)
-                    stream[removed_point] = prev_stream + ratio * (next_stream - prev_stream)
+        # Draw the removal indices directly rather than a Bernoulli coin flip per point: O(length * missing_rate)
+        # random numbers per (series, channel) instead of O(length), scattered into the mask in one go. Duplicate
+        # draws mean the removal count per channel is slightly below the nominal figure, which the Bernoulli mask
+        # only hit in expectation anyway. The start and end are never candidates.
+        num_removed = int(all_X.size(1) * missing_rate)
+        removed = torch.randint(1, all_X.size(1) - 1, (all_X.size(0), num_removed, all_X.size(2)),
+                                generator=generator)
+        keep = torch.ones(all_X.size(0), all_X.size(1), all_X.size(2), dtype=torch.bool)
+        keep.scatter_(1, removed, False)
+
+        if numba is not None:
+            # The compiled kernel writes in place, so take a fresh copy first unless we already hold one.
+            if not owns_all_X:
+                all_X = all_X.clone()
+            _interpolate_missing(all_X.numpy(), keep.numpy())
+        else:
+            # Interpolate all the removed points in one vectorised pass: a forward running-maximum locates the
+            # nearest kept point before each point, a backward running-minimum the nearest kept point after it, and
+            # then every removed value is the linear interpolation between the two. The scans run in numpy, whose
+            # accumulate exists on every supported version (torch's cummax/cummin equivalents are newer than the
+            # pinned torch).
+            X = all_X.numpy()
+            keep_np = keep.numpy()
+            index = np.broadcast_to(np.arange(all_X.size(1))[None, :, None], X.shape)
+            prev_index = np.maximum.accumulate(np.where(keep_np, index, 0), axis=1)
+            next_index = np.where(keep_np, index, all_X.size(1) - 1)
+            next_index = np.minimum.accumulate(next_index[:, ::-1], axis=1)[:, ::-1]
+            prev_X = np.take_along_axis(X, prev_index, axis=1)
+            next_X = np.take_along_axis(X, next_index, axis=1)
+            # times is linspace(0, length - 1, length), i.e. affine in the index, so the interpolation ratio is pure
+            # index arithmetic and there's no need to index into times at all. The maximum avoids 0/0 at the kept
+            # points, whose (unused) interpolations are masked out by the where.
+            ratio = ((index - prev_index) / np.maximum(next_index - prev_index, 1)).astype(X.dtype)
+            all_X = torch.from_numpy(np.where(keep_np, X, prev_X + ratio * (next_X - prev_X)))
 
     # Now fix the labels to be integers from 0 upwards
-    targets = co.OrderedDict()
-    counter = 0
-    for yi in all_y:
-        if yi not in targets:
-            targets[yi] = counter
-            counter += 1
-    all_y = torch.tensor([targets[yi] for yi in all_y])
+    classes, all_y = np.unique(all_y, return_inverse=True)
+    all_y = torch.as_tensor(all_y, dtype=torch.long)
 
     # use original train/test splits
     trainval_X, test_X = all_X[:amount_train], all_X[amount_train:]
@@ -195,19 +354,31 @@ def get_data(dataset_name, missing_rate, noise_channels):
                                                                               shuffle=True,
                                                                               stratify=trainval_y)
 
-    val_X = common.normalise_data(val_X, train_X)
-    test_X = common.normalise_data(test_X, train_X)
-    train_X = common.normalise_data(train_X, train_X)
+    # Fit the normalisation statistics once and apply them in-place to each split: normalise_data would refit them
+    # (two full reductions over train_X) per split, and out-of-place application allocates a temporary per split.
+    # train_X and val_X are advanced-indexed copies, but test_X is a view of all_X (possibly of the mmap'd cache),
+    # so it is materialised before being written in-place.
+    test_X = test_X.clone()
+    mean, std = common.compute_stats(train_X)
+    for X in (train_X, val_X, test_X):
+        X.sub_(mean).div_(1e-5 + std)
+
+    if torch.cuda.is_available():
+        # Pin once at construction, so every epoch's host-to-device copies can DMA without a staging copy.
+        train_X = train_X.pin_memory()
+        val_X = val_X.pin_memory()
+        test_X = test_X.pin_memory()
 
     train_dataset = torch.utils.data.TensorDataset(train_X, train_y)
     val_dataset = torch.utils.data.TensorDataset(val_X, val_y)
     test_dataset = torch.utils.data.TensorDataset(test_X, test_y)
 
     train_dataloader = common.dataloader(train_dataset, batch_size=1024)
-    val_dataloader = common.dataloader(val_dataset, batch_size=1024)
-    test_dataloader = common.dataloader(test_dataset, batch_size=1024)
+    # Evaluation must see every sample exactly once, and gains nothing from shuffling.
+    val_dataloader = common.dataloader(val_dataset, batch_size=1024, shuffle=False, drop_last=False)
+    test_dataloader = common.dataloader(test_dataset, batch_size=1024, shuffle=False, drop_last=False)
 
-    num_classes = counter
+    num_classes = len(classes)
     input_channels = train_X.size(-1)
 
     assert num_classes >= 2, "Have only {} classes.".format(num_classes)
@@ -266,6 +437,52 @@ def main(dataset_name,                        # dataset parameters
                        save_on_uniform_grid)
 
 
+def _claim_device(device_queue):
+    # Executor initializer: runs once in each worker process, before any job. Workers are reused across jobs and
+    # torch only reads CUDA_VISIBLE_DEVICES when it first initialises CUDA, so a device must be claimed for the
+    # worker's whole lifetime (claiming per job would stop corresponding to anything after the worker's first job).
+    # Hence also spawn, so no CUDA state is inherited from the parent.
+    os.environ['CUDA_VISIBLE_DEVICES'] = str(device_queue.get())
+
+
+def _run_job(seed, not_done_args, kwargs):
+    # Runs in a worker process; see _claim_device for the GPU assignment.
+    # Re-check at run time: every repeat of a subfolder is queued up front, so an earlier repeat may have completed
+    # (or still be running elsewhere) since this job was queued.
+    if common.assert_not_done(*not_done_args):
+        common.handle_seeds(seed)
+        main(**kwargs)
+
+
+def _parallel_sweep(jobs):
+    """Runs each (seed, assert_not_done args, kwargs-for-main) job in `jobs` across a pool of worker processes, one
+    per visible GPU, with each worker holding a distinct GPU for its lifetime.
+
+    The jobs are independent of one another, so this parallelises the sweep at the process level. (Training itself
+    currently runs on the CPU throughout this codebase, so that process parallelism is the whole win; the per-worker
+    GPU claim just keeps any CUDA use from colliding.) With fewer than two GPUs the jobs run sequentially
+    in-process, as before.
+    """
+    num_devices = torch.cuda.device_count()
+    if num_devices < 2:
+        for seed, not_done_args, kwargs in jobs:
+            if common.assert_not_done(*not_done_args):
+                common.handle_seeds(seed)
+                main(**kwargs)
+        return
+    manager = multiprocessing.Manager()
+    device_queue = manager.Queue()
+    for device in range(num_devices):
+        device_queue.put(device)
+    mp_context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_devices, mp_context=mp_context,
+                                                initializer=_claim_device, initargs=(device_queue,)) as executor:
+        futures = [executor.submit(_run_job, seed, not_done_args, kwargs)
+                   for seed, not_done_args, kwargs in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+
+
 def hyperparameter_search_old():
     result_folder = 'uea_hyperparameter_search'
     for dataset_name in datasets_by_cost:
@@ -301,61 +518,74 @@ def hyperparameter_search_l2():
 
 def comparison_test():
     seed = 5394
+    jobs = []
     for i in range(0, 3):
         result_folder = 'uea_comparison'
         for dataset_name, shapelets_per_class, shapelet_length_proportion in old_hyperparameter_output:
             for discrepancy_fn in ('L2', 'logsig-3'):
+                job_seed = seed
                 seed = common.handle_seeds(seed)
                 result_subfolder = discrepancy_fn + 'diagonal' if discrepancy_fn == 'logsig-3' else discrepancy_fn + '-diagonal'
                 dataset_detail = ''
                 full_result_subfolder = _subfolder(dataset_name, dataset_detail, result_subfolder)
                 if common.assert_not_done(result_folder, full_result_subfolder, n_done=3, seed=i):
-                    print("Starting comparison: " + full_result_subfolder)
-                    main(dataset_name,
-                         result_folder=result_folder,
-                         result_subfolder=result_subfolder,
-                         discrepancy_fn=discrepancy_fn,
-                         num_shapelets_per_class=shapelets_per_class,
-                         max_shapelet_length_proportion=min(1, shapelet_length_proportion + 0.1))
-
+                    print("Queueing comparison: " + full_result_subfolder)
+                    jobs.append((job_seed,
+                                 (result_folder, full_result_subfolder, 3, i),
+                                 dict(dataset_name=dataset_name,
+                                      result_folder=result_folder,
+                                      result_subfolder=result_subfolder,
+                                      discrepancy_fn=discrepancy_fn,
+                                      num_shapelets_per_class=shapelets_per_class,
+                                      max_shapelet_length_proportion=min(1, shapelet_length_proportion + 0.1))))
+
+            job_seed = seed
             seed = common.handle_seeds(seed)
             result_subfolder = 'old'
             dataset_detail = ''
             full_result_subfolder = _subfolder(dataset_name, dataset_detail, result_subfolder)
             if common.assert_not_done(result_folder, full_result_subfolder, n_done=3, seed=i):
-                print("Starting comparison: " + full_result_subfolder)
-                main(dataset_name,
-                     result_folder=result_folder,
-                     result_subfolder=result_subfolder,
-                     old_shapelets=True,
-                     num_shapelets_per_class=shapelets_per_class,
-                     max_shapelet_length_proportion=shapelet_length_proportion)
+                print("Queueing comparison: " + full_result_subfolder)
+                jobs.append((job_seed,
+                             (result_folder, full_result_subfolder, 3, i),
+                             dict(dataset_name=dataset_name,
+                                  result_folder=result_folder,
+                                  result_subfolder=result_subfolder,
+                                  old_shapelets=True,
+                                  num_shapelets_per_class=shapelets_per_class,
+                                  max_shapelet_length_proportion=shapelet_length_proportion)))
+    _parallel_sweep(jobs)
 
 
 def missing_and_length_test():
     seed = 5678
+    jobs = []
     for i in range(3):
         result_folder = 'uea_missing_and_length'
         for dataset_name, num_shapelets_per_class, best_length_proportion, worst_length_proportion in l2_hyperparameter_output:
             for missing_rate in (0.1, 0.3, 0.5):
                 discrepancy_fn = 'L2'
                 for learntlengths in (True, False):
+                    job_seed = seed
                     seed = common.handle_seeds(seed)
                     result_subfolder = discrepancy_fn + '-' + str(learntlengths)
                     dataset_detail = str(int(missing_rate * 100))
                     full_result_subfolder = _subfolder(dataset_name, dataset_detail, result_subfolder)
                     if common.assert_not_done(result_folder, full_result_subfolder, n_done=3):
-                        print("Starting comparison: " + full_result_subfolder)
-                        main(dataset_name,
-                             result_folder=result_folder,
-                             result_subfolder=result_subfolder,
-                             dataset_detail=dataset_detail,
-                             missing_rate=missing_rate,
-                             discrepancy_fn=discrepancy_fn,
-                             max_shapelet_length_proportion=1.0 if learntlengths else best_length_proportion,
-                             num_shapelets_per_class=num_shapelets_per_class,
-                             initialization_proportion=None if not learntlengths else worst_length_proportion,
-                             ablation_learntlengths=learntlengths)
+                        print("Queueing comparison: " + full_result_subfolder)
+                        jobs.append((job_seed,
+                                     (result_folder, full_result_subfolder, 3, i),
+                                     dict(dataset_name=dataset_name,
+                                          result_folder=result_folder,
+                                          result_subfolder=result_subfolder,
+                                          dataset_detail=dataset_detail,
+                                          missing_rate=missing_rate,
+                                          discrepancy_fn=discrepancy_fn,
+                                          max_shapelet_length_proportion=1.0 if learntlengths else best_length_proportion,
+                                          num_shapelets_per_class=num_shapelets_per_class,
+                                          initialization_proportion=None if not learntlengths else worst_length_proportion,
+                                          ablation_learntlengths=learntlengths)))
+    _parallel_sweep(jobs)
 
 
 def pendigits_interpretability():